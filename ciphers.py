@@ -1,6 +1,6 @@
 #!/bin/python
 
-import re, fractions
+import math, functools
 
 # The full uppercase alphabet
 u_alpha = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
@@ -8,6 +8,73 @@ u_alpha = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 # The full upper and lowercased alphabet
 ul_alpha = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
 
+# Translation table that uppercases letters
+upper = bytes.maketrans( ul_alpha[len(u_alpha):].encode(), u_alpha.encode() )
+
+# Every byte that isn't a letter, deleted when cleaning text
+non_alpha = bytes( c for c in range(256) if chr(c) not in ul_alpha )
+
+def build_shifts( alpha ):
+    """
+    Build the Vigenere tables for every shift of an alphabet
+
+    :param bytes alpha: The alphabet to shift
+    :return: A tuple of the encrypt tables and the decrypt tables
+    """
+    rotated = [ alpha[s:] + alpha[:s] for s in range(len(alpha)) ]
+    return ( tuple( bytes.maketrans(alpha, r) for r in rotated ),
+             tuple( bytes.maketrans(r, alpha) for r in rotated ) )
+
+# Vigenere tables for every shift of both alphabets, by [full][decrypt][shift]
+shifts = { False: build_shifts(u_alpha.encode()), True: build_shifts(ul_alpha.encode()) }
+
+# Modular inverses for every modulo that fits within the alphabets
+inverses = { m: { a: pow(a,-1,m) for a in range(1,m) if math.gcd(a,m) == 1 }
+             for m in range(2,len(ul_alpha) + 1) }
+
+def clean( text, full ):
+    """
+    Strip everything but ASCII letters from text
+
+    :param str text: The text to clean
+    :param bool full: Flag that keeps lowercase letters instead of uppercasing
+    :return: The cleaned text
+    """
+    text = text.encode('ascii','ignore')
+    return text.translate(None if full else upper, non_alpha).decode('ascii')
+
+@functools.lru_cache(maxsize=8)
+def shift_tables( key, full, decrypt = False ):
+    """
+    Look up the translation table for each position of a Vigenere key
+
+    :param str key: The key to build tables for
+    :param bool full: Flag that switches between full/uppercase only alphabets
+    :param bool decrypt: Flag that builds tables that undo the shift
+    :return: A tuple of translation tables, one per key letter
+    """
+    tables = shifts[bool(full)][decrypt]
+    key = clean(key, full)
+    if not key: raise Exception("Key doesn't contain any letters")
+
+    return tuple( tables[k - ord('A') if k < ord('a') else k - ord('a') + len(u_alpha)]
+                  for k in key.encode('ascii') )
+
+def shift( text, tables ):
+    """
+    Shift text with a set of Vigenere translation tables
+
+    :param bytes text: The cleaned text to shift
+    :param tuple tables: The translation tables, one per key letter
+    :return: The shifted text
+    """
+    # Letters under the same position of the key share one shift
+    result = bytearray(len(text))
+    for i,table in enumerate(tables):
+        result[i::len(tables)] = text[i::len(tables)].translate(table)
+
+    return result
+
 # ----------------------------------------------------------------------------
 # VIGENERE CIPHER
 class VigenereCipher:
@@ -18,19 +85,9 @@ class VigenereCipher:
     :param bool full: Flag that switches between full/uppercase only alphabets
     """ 
     def __init__( self, plaintext, full ):
-        alpha = ul_alpha if full else u_alpha
-        vtable = [ alpha for a in alpha ]
-
-        for i,row in enumerate(vtable):
-            back, front = row[-i:], row[:-i]
-            vtable[i] = back + front
-
-        vtable.sort()
-        
         self.full = full
-        self.text = re.sub(r"\W+", "", plaintext, flags=re.UNICODE)
-        if not full: self.text = self.text.upper()
-        self.table = [ [ c for c in l ] for l in vtable ]
+        self.text = clean(plaintext, full)
+        self.key  = None
 
     @classmethod
     def from_file( cls, filename, full = False ):
@@ -53,45 +110,78 @@ class VigenereCipher:
         """
         return cls(plaintext,full)
 
-    def encrypt( self, key ):
+    @classmethod
+    def encrypt_stream( cls, key, in_path, out_path, full = False, chunk = 1 << 20 ):
         """
-        Encrypt the held text
+        Encrypt a file into another file a chunk at a time
 
         :param str key: The key to encrypt with
+        :param str in_path: The file to encrypt
+        :param str out_path: The path to save the encrypted text to
+        :param bool full: Flag to switch between full/upper alphabets
+        :param int chunk: The number of characters to read at a time
+        """
+        key = clean(key, full)
+        if not key: raise Exception("Key doesn't contain any letters")
+
+        with open(in_path) as src, open(out_path,'w') as dst:
+            for text in iter(lambda: src.read(chunk), ''):
+                text = cls(text, full).encrypt(key).text
+                dst.write(text)
+
+                # Continue the next chunk from where this one left the key
+                n = len(text) % len(key)
+                key = key[n:] + key[:n]
+
+    @classmethod
+    def batch_decrypt( cls, ciphertext, keys, full = False ):
+        """
+        Decrypt the same text with each of several keys
+
+        :param str ciphertext: The text to decrypt
+        :param list keys: The keys to try
+        :param bool full: Flag to switch between full/upper alphabets
+        :return: A list of decrypted texts in the same order as the keys
+        """
+        text = clean(ciphertext, full).encode('ascii')
+        return [ shift(text, shift_tables(key, full, True)).decode('ascii') for key in keys ]
+
+    def set_key( self, key ):
+        """
+        Clean and store a key to use when encrypt/decrypt aren't given one
+
+        :param str key: The key to store
         :return: This VigenereCipher object
         """
-        key = self.expand(key, len(self.text))
-        result = ['' for x in range(len(self.text))]
-        for i,c in enumerate(self.text):
-            ci = self.table[0].index( self.text[i] )
-            ri = 0
-            for j,l in enumerate(self.table):
-                if l[0] == key[i]:
-                    ri = j
+        self.key = clean(key, self.full)
 
+        return self
 
-            result[i] = self.table[ ri ][ ci ]
+    def encrypt( self, key = None ):
+        """
+        Encrypt the held text
 
-        self.text = ''.join(result)
+        :param str key: The key to encrypt with, defaults to the key from set_key
+        :return: This VigenereCipher object
+        """
+        key = self.key if key is None else key
+        if key is None: raise Exception("No key has been set")
+        tables = shift_tables(key, self.full, False)
+        self.text = shift(self.text.encode('ascii'), tables).decode('ascii')
 
         return self
 
-    def decrypt( self, key ):
+    def decrypt( self, key = None ):
         """
         Decrypt the held text
 
-        :param str key: The key to decrypt with
+        :param str key: The key to decrypt with, defaults to the key from set_key
         :return: This VigenereCipher object
         """
-        key = self.expand(key,len(self.text))
-        result = ['' for x in range(len(self.text))]
-        for i,c in enumerate(self.text):
-            ri = 0
-            for j,l in enumerate(self.table):
-                if l[0] == key[i]:
-                    result[i] = self.table[ 0 ][ self.table[j].index(c) ]
-
-        self.text = ''.join(result)
+        key = self.key if key is None else key
+        if key is None: raise Exception("No key has been set")
+        tables = shift_tables(key, self.full, True)
+        self.text = shift(self.text.encode('ascii'), tables).decode('ascii')
 
         return self
 
@@ -102,15 +192,9 @@ class VigenereCipher:
         :param str key: The short form of the key
         "param int length: The length to expand to
         """
-        vkey = '' 
-        key = re.sub(r"\W+", "", key, flags=re.UNICODE)
-        if not self.full: key = key.upper()
+        key = clean(key, self.full)
 
-        for i in range(length):
-            i = i % len(key)
-            vkey += key[i]
-
-        return vkey
+        return (key * -(-length // len(key)))[:length]
 
     def save( self, filename ):
         """
@@ -144,15 +228,14 @@ class BlockAffineCipher:
     :param bool full: Flag that switches between full/uppercase only alphabets
     """ 
 
+    # The number of letters per block, the text is padded to a multiple of it
+    block = 2
+
     def __init__( self, plaintext, modulo, full ):
-        self.block = 2
         self.modulo = modulo
         self.alpha = ul_alpha if full else u_alpha
-        self.text = re.sub(r"\W+","",plaintext,flags=re.UNICODE)
-        if not full: self.text = self.text.upper()
-
-        while (len(self.text) % self.block) > 0:
-            self.text += 'A'
+        self.text = clean(plaintext, full)
+        self.text += 'A' * (-len(self.text) % self.block)
 
     @classmethod
     def from_file( cls, filename, mod, full = False ):
@@ -188,13 +271,11 @@ class BlockAffineCipher:
         :param int keyb: A user-provided offset
         :return: This BlockAffineCipher object
         """
-        result = ['' for x in self.text]
-        for i,ch in enumerate(self.text):
-            num = self.alpha.find(ch)
-            num = ((keya*num) + keyb) % self.modulo
-            result[i] = self.alpha[num]
+        alpha = self.alpha.encode('ascii')
+        table = bytes( alpha[((keya*num) + keyb) % self.modulo] for num in range(len(alpha)) )
 
-        self.text = ''.join(result)
+        text = self.text.encode('ascii').translate(bytes.maketrans(alpha,table))
+        self.text = text.decode('ascii')
 
         return self
 
@@ -207,21 +288,16 @@ class BlockAffineCipher:
         :param int keyb: A user-provided offset
         :return: This BlockAffineCipher object
         """
-        result = ['' for x in self.text]
-
-        def get_inverse( a, m ):
-            if fractions.gcd(a,m) == 1:
-                for i in range(1,m):
-                    if (a*i)%m == 1: return i
+        try:
+            mod_inv = inverses[self.modulo][keya % self.modulo]
+        except KeyError:
             raise Exception("Couldn't find a modulo inverse")
 
-        for i,ch in enumerate(self.text):
-            num = self.alpha.find(ch)
-            mod_inv = get_inverse( keya, self.modulo )
-            num = (mod_inv*(num - keyb)) % self.modulo
-            result[i] = self.alpha[num]
+        alpha = self.alpha.encode('ascii')
+        table = bytes( alpha[(mod_inv*(num - keyb)) % self.modulo] for num in range(len(alpha)) )
 
-        self.text = ''.join(result)
+        text = self.text.encode('ascii').translate(bytes.maketrans(alpha,table))
+        self.text = text.decode('ascii')
 
         return self
 
@@ -246,6 +322,35 @@ class BlockAffineCipher:
         """
         return self.text
 
+# ----------------------------------------------------------------------------
+# PIPELINE
+def pipeline( plaintext, vkey, keya, keyb, modulo, full = False ):
+    """
+    Encrypt text with a Vigenere cipher followed by a Block Affine cipher
+
+    Both substitutions are composed into one table per key position, so
+    the text is only traversed once.
+
+    :param str plaintext: The text to encrypt
+    :param str vkey: The key for the Vigenere cipher
+    :param int keya: The multiplier for the Block Affine cipher
+    :param int keyb: The offset for the Block Affine cipher
+    :param int modulo: The modulo for the Block Affine cipher
+    :param bool full: Flag that switches between full/uppercase only alphabets
+    :return: The encrypted text
+    """
+    alpha = (ul_alpha if full else u_alpha).encode('ascii')
+    affine = bytes( alpha[((keya*num) + keyb) % modulo] for num in range(len(alpha)) )
+    affine = bytes.maketrans( alpha, affine )
+
+    tables = tuple( table.translate(affine) for table in shift_tables(vkey, full) )
+    result = shift(clean(plaintext, full).encode('ascii'), tables)
+
+    # Pad to the Block Affine block size with an encrypted 'A'
+    result += b'A'.translate(affine) * (-len(result) % BlockAffineCipher.block)
+
+    return result.decode('ascii')
+
 if __name__=='__main__':
     # Init/set variables
     full     = False
@@ -261,7 +366,7 @@ if __name__=='__main__':
 
     # Get the alphabet option
     while True:
-        alpha_opt = raw_input("Which alphabet will you use? (S or L): ")
+        alpha_opt = input("Which alphabet will you use? (S or L): ")
         if alpha_opt == 'S':
             break
         elif alpha_opt == 'L':
@@ -273,7 +378,7 @@ if __name__=='__main__':
 
     # Get the multiplier value
     while True:
-        keya_opt = raw_input("Input multiplier for Block Affine cipher: ")
+        keya_opt = input("Input multiplier for Block Affine cipher: ")
         try:
             keya = int(keya_opt)
             break
@@ -282,7 +387,7 @@ if __name__=='__main__':
 
     # Get the offset value
     while True:
-        keyb_opt = raw_input("Input offset for Block Affine cipher: ")
+        keyb_opt = input("Input offset for Block Affine cipher: ")
         try:
             keyb = int(keyb_opt)
             break
@@ -310,8 +415,8 @@ if __name__=='__main__':
     vcipher.save(vout_dec)
 
     # Print the results
-    print "------ Encryption complete! ------"
-    print "Vigenere Cipher (encrypted):     {}".format(vout_enc)
-    print "Vigenere Cipher (decrypted):     {}".format(vout_dec)
-    print "Block Affine Cipher (encrypted): {}".format(bout_enc)
-    print "Block Affine Cipher (decrypted): {}".format(bout_dec)
+    print("------ Encryption complete! ------")
+    print("Vigenere Cipher (encrypted):     {}".format(vout_enc))
+    print("Vigenere Cipher (decrypted):     {}".format(vout_dec))
+    print("Block Affine Cipher (encrypted): {}".format(bout_enc))
+    print("Block Affine Cipher (decrypted): {}".format(bout_dec))